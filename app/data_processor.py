@@ -7,17 +7,22 @@ import json
 import logging
 import re
 
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
+# Compiled once; clean_text runs over every transcript
+_DISALLOWED_CHARS_RE = re.compile(r'[^\w\s.,!?]+')
+_WHITESPACE_RE = re.compile(r'\s+')
+
 def clean_text(text):
     if not isinstance(text, str):
         logger.warning(f"Non-string input to clean_text: {type(text)}")
         return ""
-    cleaned = re.sub(r'[^\w\s.,!?]', ' ', text)
-    cleaned = re.sub(r'\s+', ' ', cleaned).strip()
-    logger.debug(f"Original text length: {len(text)}, Cleaned text length: {len(cleaned)}")
-    logger.debug(f"Cleaned text sample: '{cleaned[:100]}...'")
+    cleaned = _DISALLOWED_CHARS_RE.sub(' ', text)
+    cleaned = _WHITESPACE_RE.sub(' ', cleaned).strip()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Original text length: {len(text)}, Cleaned text length: {len(cleaned)}")
+        logger.debug(f"Cleaned text sample: '{cleaned[:100]}...'")
     return cleaned
 
 class DataProcessor:
@@ -29,6 +34,7 @@ class DataProcessor:
         self.all_fields = text_fields + keyword_fields
         self.text_index = Index(text_fields=text_fields, keyword_fields=keyword_fields)
         self.embedding_model = SentenceTransformer(embedding_model)
+        self.embedding_model_name = embedding_model
         self.documents = []
         self.embeddings = []
         self.index_built = False
@@ -57,13 +63,17 @@ class DataProcessor:
 
         logger.info(f"Number of transcript segments: {len(transcript)}")
 
+        debug = logger.isEnabledFor(logging.DEBUG)
+
         full_transcript = " ".join([segment.get('text', '') for segment in transcript])
-        logger.debug(f"Full transcript length before cleaning: {len(full_transcript)}")
-        logger.debug(f"Full transcript sample before cleaning: '{full_transcript[:500]}...'")
+        if debug:
+            logger.debug(f"Full transcript length before cleaning: {len(full_transcript)}")
+            logger.debug(f"Full transcript sample before cleaning: '{full_transcript[:500]}...'")
 
         cleaned_transcript = clean_text(full_transcript)
-        logger.debug(f"Cleaned transcript length: {len(cleaned_transcript)}")
-        logger.debug(f"Cleaned transcript sample: '{cleaned_transcript[:500]}...'")
+        if debug:
+            logger.debug(f"Cleaned transcript length: {len(cleaned_transcript)}")
+            logger.debug(f"Cleaned transcript sample: '{cleaned_transcript[:500]}...'")
 
         if not cleaned_transcript:
             logger.warning(f"Empty cleaned transcript for video {video_id}")
@@ -83,13 +93,14 @@ class DataProcessor:
             "video_duration": metadata.get('duration', '')
         }
         
-        logger.debug(f"Document created for video {video_id}")
-        for field in self.all_fields:
-            logger.debug(f"Document {field} length: {len(str(doc.get(field, '')))}")
-            logger.debug(f"Document {field} sample: '{str(doc.get(field, ''))[:100]}...'")
+        if debug:
+            logger.debug(f"Document created for video {video_id}")
+            for field in self.all_fields:
+                logger.debug(f"Document {field} length: {len(str(doc.get(field, '')))}")
+                logger.debug(f"Document {field} sample: '{str(doc.get(field, ''))[:100]}...'")
 
         self.documents.append(doc)
-        embedding = self.embedding_model.encode(cleaned_transcript + " " + metadata.get('title', ''))
+        embedding = self.embedding_model.encode(self.embedding_text(doc))
         self.embeddings.append(embedding)
 
         logger.info(f"Processed transcript for video {video_id}")
@@ -101,6 +112,10 @@ class DataProcessor:
             'index_name': f"video_{video_id}_{self.embedding_model.get_sentence_embedding_dimension()}"
         }
 
+    def embedding_text(self, doc):
+        """Text a document's vector is computed from: the transcript followed by the title"""
+        return doc.get('content', '') + " " + doc.get('title', '')
+
     def build_index(self, index_name):
         if not self.documents:
             logger.error("No documents to index")
@@ -128,8 +143,9 @@ class DataProcessor:
         logger.info(f"Number of valid documents to index: {len(docs_to_index)}")
 
         # Log the structure of the first document to be indexed
-        logger.debug("Structure of the first document to be indexed:")
-        logger.debug(json.dumps(docs_to_index[0], indent=2))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Structure of the first document to be indexed:")
+            logger.debug(json.dumps(docs_to_index[0], indent=2))
 
         try:
             logger.info("Fitting text index")
@@ -146,6 +162,7 @@ class DataProcessor:
                     "mappings": {
                         "properties": {
                             "embedding": {"type": "dense_vector", "dims": len(self.embeddings[0]), "index": True, "similarity": "cosine"},
+                            "embedding_model": {"type": "keyword"},
                             "content": {"type": "text"},
                             "title": {"type": "text"},
                             "description": {"type": "text"},
@@ -165,6 +182,8 @@ class DataProcessor:
             for doc, embedding in zip(self.documents, self.embeddings):
                 doc_with_embedding = doc.copy()
                 doc_with_embedding['embedding'] = embedding.tolist()
+                # Recorded so stored vectors are only reused with the model that produced them
+                doc_with_embedding['embedding_model'] = self.embedding_model_name
                 self.es.index(index=index_name, body=doc_with_embedding, id=doc['segment_id'])
             
             logger.info(f"Successfully indexed {len(self.documents)} documents in Elasticsearch")
@@ -177,16 +196,20 @@ class DataProcessor:
     def compute_rrf(self, rank, k=60):
         return 1 / (k + rank)
 
-    def hybrid_search(self, query, index_name, num_results=5):
+    def encode_query(self, query, query_vector=None):
+        """Query embedding as a list, reusing one the caller already computed"""
+        if query_vector is None:
+            query_vector = self.embedding_model.encode(query)
+        return query_vector.tolist()
+
+    def hybrid_search(self, query, index_name, num_results=5, query_vector=None):
         if not index_name:
             logger.error("No index name provided for hybrid search.")
             raise ValueError("No index name provided for hybrid search.")
         
-        vector = self.embedding_model.encode(query)
-        
         knn_query = {
             "field": "embedding",
-            "query_vector": vector.tolist(),
+            "query_vector": self.encode_query(query, query_vector),
             "k": 10,
             "num_candidates": 100
         }
@@ -239,7 +262,10 @@ class DataProcessor:
             logger.error(f"Error in hybrid search: {str(e)}")
             raise
 
-    def search(self, query, filter_dict={}, boost_dict={}, num_results=10, method='hybrid', index_name=None):
+    def search(self, query, filter_dict={}, boost_dict={}, num_results=10, method='hybrid', index_name=None,
+               join_with=None, query_vector=None):
+        """Search an index; with join_with, return (contents joined by it, docs) instead of just the docs.
+        A precomputed query_vector skips re-encoding the query for embedding and hybrid search."""
         if not index_name:
             logger.error("No index name provided for search.")
             raise ValueError("No index name provided for search.")
@@ -252,11 +278,14 @@ class DataProcessor:
         
         try:
             if method == 'text':
-                return self.text_search(query, filter_dict, boost_dict, num_results, index_name)
+                results = self.text_search(query, filter_dict, boost_dict, num_results, index_name)
             elif method == 'embedding':
-                return self.embedding_search(query, num_results, index_name)
+                results = self.embedding_search(query, num_results, index_name, query_vector)
             else:  # hybrid search
-                return self.hybrid_search(query, index_name, num_results)
+                results = self.hybrid_search(query, index_name, num_results, query_vector)
+            if join_with is not None:
+                return join_with.join(doc.get('content', '') for doc in results), results
+            return results
         except Exception as e:
             logger.error(f"Error in search method {method}: {str(e)}")
             raise
@@ -282,13 +311,13 @@ class DataProcessor:
             logger.error(f"Error in text search: {str(e)}")
             raise
 
-    def embedding_search(self, query, num_results=10, index_name=None):
+    def embedding_search(self, query, num_results=10, index_name=None, query_vector=None):
         if not index_name:
             logger.error("No index name provided for embedding search.")
             raise ValueError("No index name provided for embedding search.")
         
         try:
-            query_vector = self.embedding_model.encode(query).tolist()
+            query_vector = self.encode_query(query, query_vector)
             script_query = {
                 "script_score": {
                     "query": {"match_all": {}},
@@ -313,4 +342,5 @@ class DataProcessor:
     
     def set_embedding_model(self, model_name):
         self.embedding_model = SentenceTransformer(model_name)
+        self.embedding_model_name = model_name
         logger.info(f"Embedding model set to: {model_name}")
\ No newline at end of file
@@ -218,10 +218,20 @@ class DatabaseHandler:
                 )
             ''')
 
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT,
+                    created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
             # Create indices for better performance
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_video_id ON videos(youtube_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_video ON user_feedback(video_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_chat_video ON chat_history(video_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_rag_eval_video ON rag_evaluations(video_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_es_index_video ON elasticsearch_indices(video_id)')
             
         except Exception as e:
             logger.error(f"Error creating tables: {str(e)}")
@@ -325,6 +335,33 @@ class DatabaseHandler:
         cursor.execute('SELECT * FROM videos WHERE youtube_id = ?', (youtube_id,))
         return cursor.fetchone()
 
+    def get_transcript_content(self, youtube_id):
+        """Get the stored transcript text for a video"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT transcript_content FROM videos WHERE youtube_id = ?', (youtube_id,))
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+    def _fetch_by_youtube_ids(self, sql_template, youtube_ids, chunk_size=500):
+        """Run a query with an IN ({placeholders}) clause over many YouTube IDs and return all rows"""
+        rows = []
+        youtube_ids = list(youtube_ids)
+        cursor = self.conn.cursor()
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(youtube_ids), chunk_size):
+            chunk = youtube_ids[start:start + chunk_size]
+            cursor.execute(sql_template.format(placeholders=','.join('?' * len(chunk))), chunk)
+            rows.extend(cursor.fetchall())
+        return rows
+
+    def get_transcripts_content(self, youtube_ids):
+        """Get stored transcript texts for many videos in as few queries as possible"""
+        return dict(self._fetch_by_youtube_ids('''
+            SELECT youtube_id, transcript_content
+            FROM videos
+            WHERE youtube_id IN ({placeholders})
+        ''', youtube_ids))
+
     def get_all_videos(self):
         """Get all videos"""
         cursor = self.conn.cursor()
@@ -335,6 +372,46 @@ class DatabaseHandler:
         ''')
         return cursor.fetchall()
 
+    def get_videos_page(self, offset, limit, channel_filter=None):
+        """Get one page of videos, optionally for a single channel"""
+        cursor = self.conn.cursor()
+        if channel_filter:
+            cursor.execute('''
+                SELECT youtube_id, title, channel_name, upload_date
+                FROM videos
+                WHERE channel_name = ?
+                ORDER BY upload_date DESC, youtube_id
+                LIMIT ? OFFSET ?
+            ''', (channel_filter, limit, offset))
+        else:
+            cursor.execute('''
+                SELECT youtube_id, title, channel_name, upload_date
+                FROM videos
+                ORDER BY upload_date DESC, youtube_id
+                LIMIT ? OFFSET ?
+            ''', (limit, offset))
+        return cursor.fetchall()
+
+    def count_videos(self, channel_filter=None):
+        """Count videos, optionally for a single channel"""
+        cursor = self.conn.cursor()
+        if channel_filter:
+            cursor.execute('SELECT COUNT(*) FROM videos WHERE channel_name = ?', (channel_filter,))
+        else:
+            cursor.execute('SELECT COUNT(*) FROM videos')
+        return cursor.fetchone()[0]
+
+    def get_video_channels(self):
+        """Get the distinct channel names of all videos"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT DISTINCT channel_name
+            FROM videos
+            WHERE channel_name IS NOT NULL
+            ORDER BY channel_name
+        ''')
+        return [row[0] for row in cursor.fetchall()]
+
     def add_chat_message(self, video_id, user_message, assistant_message):
         """Add a chat message"""
         cursor = self.conn.cursor()
@@ -444,6 +521,18 @@ class DatabaseHandler:
         result = cursor.fetchone()
         return result[0] if result else None
 
+    def get_elasticsearch_indices_by_youtube_ids(self, youtube_ids):
+        """Get Elasticsearch indices for many YouTube IDs in as few queries as possible"""
+        indices = {}
+        for youtube_id, index_name in self._fetch_by_youtube_ids('''
+            SELECT v.youtube_id, ei.index_name
+            FROM elasticsearch_indices ei
+            JOIN videos v ON ei.video_id = v.id
+            WHERE v.youtube_id IN ({placeholders})
+        ''', youtube_ids):
+            indices.setdefault(youtube_id, index_name)
+        return indices
+
     def add_ground_truth_questions(self, video_id, questions):
         """Add ground truth questions"""
         try:
@@ -545,6 +634,29 @@ class DatabaseHandler:
             logger.error(f"Error saving RAG evaluation: {str(e)}")
             raise
 
+    def save_rag_evaluations(self, evaluations):
+        """Save many RAG evaluation results in a single transaction"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('BEGIN')
+            cursor.executemany('''
+                INSERT INTO rag_evaluations 
+                (video_id, question, answer, relevance, explanation)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(
+                evaluation_data['video_id'],
+                evaluation_data['question'],
+                evaluation_data['answer'],
+                evaluation_data['relevance'],
+                evaluation_data['explanation']
+            ) for evaluation_data in evaluations])
+            cursor.execute('COMMIT')
+        except Exception as e:
+            if self.conn.in_transaction:
+                self.conn.rollback()
+            logger.error(f"Error saving RAG evaluations: {str(e)}")
+            raise
+
     def get_latest_evaluation_results(self, video_id=None):
         """Get latest evaluation results"""
         cursor = self.conn.cursor()
@@ -578,6 +690,28 @@ class DatabaseHandler:
             ''')
         return cursor.fetchall()
 
+    def get_llm_cache(self, key):
+        """Get a cached LLM response by its prompt hash"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT response FROM llm_cache WHERE key = ?', (key,))
+            result = cursor.fetchone()
+            return result[0] if result else None
+        except Exception as e:
+            logger.error(f"Error reading LLM cache: {str(e)}")
+            return None
+
+    def add_llm_cache(self, key, response):
+        """Store an LLM response under its prompt hash"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO llm_cache (key, response)
+                VALUES (?, ?)
+            ''', (key, response))
+        except Exception as e:
+            logger.error(f"Error writing LLM cache: {str(e)}")
+
     def __enter__(self):
         """Context manager entry"""
         return self
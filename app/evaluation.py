@@ -1,25 +1,67 @@
 from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
-import pandas as pd
 import json
 # import ollama
-import openvino_genai as ov_genai
+from llm import get_llm_pipeline, cached_generate, make_generation_config
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 import requests
-import sqlite3
 from tqdm import tqdm
+import optuna
 import csv
 
+@lru_cache(maxsize=8)
+def split_prompt_template(prompt_template):
+    """Split a judge prompt template once into the static text around {question} and {answer_llm}"""
+    if prompt_template.count('{question}') != 1 or prompt_template.count('{answer_llm}') != 1:
+        return None
+    if prompt_template.index('{question}') > prompt_template.index('{answer_llm}'):
+        return None
+    prefix, rest = prompt_template.split('{question}')
+    middle, suffix = rest.split('{answer_llm}')
+    # Undo str.format brace escaping in the static parts
+    return tuple(part.replace('{{', '{').replace('}}', '}') for part in (prefix, middle, suffix))
+
 class EvaluationSystem:
-    def __init__(self, data_processor, database_handler):
+    def __init__(self, data_processor, database_handler, replay_only=False):
         self.data_processor = data_processor
         self.db_handler = database_handler
+        # Serve answers and verdicts from the LLM cache only, without calling the model
+        self.replay_only = replay_only
+        self.judge_config = make_generation_config(512)
+
+    def doc_embeddings(self, docs):
+        """Stack document embeddings, reusing the vectors stored alongside retrieved docs.
+
+        A document is represented by its indexed vector (transcript followed by title, the same
+        vector retrieval ranks on), so relevance measures the query against what was indexed.
+        Stored vectors are reused only when the index recorded the current embedding model.
+        """
+        model_name = self.data_processor.embedding_model_name
+        missing = [i for i, doc in enumerate(docs)
+                   if doc.get('embedding') is None or doc.get('embedding_model') != model_name]
+        if missing:
+            # Encode only the docs without a usable stored vector, in one batch
+            encoded = self.data_processor.embedding_model.encode(
+                [self.data_processor.embedding_text(docs[i]) for i in missing])
+            for i, embedding in zip(missing, encoded):
+                docs[i]['embedding'] = embedding
+                docs[i]['embedding_model'] = model_name
+        return np.asarray([doc['embedding'] for doc in docs], dtype=np.float32)
+
+    def calculate_relevance(self, doc_embeddings, query_embedding):
+        """Cosine similarity of every document embedding against the query in one matrix product"""
+        norms = np.linalg.norm(doc_embeddings, axis=1) * np.linalg.norm(query_embedding)
+        return (doc_embeddings @ query_embedding) / np.maximum(norms, 1e-12)
 
     def relevance_scoring(self, query, retrieved_docs, top_k=5):
-        query_embedding = self.data_processor.embedding_model.encode(query)
-        doc_embeddings = [self.data_processor.embedding_model.encode(doc['content']) for doc in retrieved_docs]
-        
-        similarities = cosine_similarity([query_embedding], doc_embeddings)[0]
-        return np.mean(sorted(similarities, reverse=True)[:top_k])
+        if not retrieved_docs or not query or not query.strip():
+            return 0.0
+        query_embedding = np.asarray(self.data_processor.embedding_model.encode(query), dtype=np.float32)
+        similarities = self.calculate_relevance(
+            self.doc_embeddings(retrieved_docs), query_embedding)
+        top = np.argsort(-similarities)[:top_k]
+        return np.mean(similarities[top])
 
     def answer_similarity(self, generated_answer, reference_answer):
         gen_embedding = self.data_processor.embedding_model.encode(generated_answer)
@@ -43,7 +85,8 @@ class EvaluationSystem:
 
         for query, reference in zip(test_queries, reference_answers):
             retrieved_docs = rag_system.data_processor.search(query, num_results=5, method='hybrid', index_name=index_name)
-            generated_answer, _ = rag_system.query(query, search_method='hybrid', index_name=index_name)
+            generated_answer, _ = rag_system.query(query, search_method='hybrid', index_name=index_name,
+                                                   use_semantic_cache=False)
 
             relevance_scores.append(self.relevance_scoring(query, retrieved_docs))
             similarity_scores.append(self.answer_similarity(generated_answer, reference))
@@ -56,7 +99,12 @@ class EvaluationSystem:
         }
 
     def llm_as_judge(self, question, generated_answer, prompt_template):
-        prompt = prompt_template.format(question=question, answer_llm=generated_answer)
+        parts = split_prompt_template(prompt_template)
+        if parts:
+            prefix, middle, suffix = parts
+            prompt = f"{prefix}{question}{middle}{generated_answer}{suffix}"
+        else:
+            prompt = prompt_template.format(question=question, answer_llm=generated_answer)
         
         # try:
         #     response = ollama.chat(
@@ -70,47 +118,79 @@ class EvaluationSystem:
         #     return None
 
         try:
-            # Use OpenVINO GenAI to evaluate the model
-            # Load the OpenVINO model (ensure it's correctly loaded in your system)
-            model_path = os.getenv('OPENVINO_MODEL_PATH', '/app/models/Phi-3-mini-128k-instruct-int4-ov')
-            device = os.getenv('OPENVINO_DEVICE', 'CPU')
-            model = ov_genai.load_model(model_path, device=device)
-
-            # Generate the response using OpenVINO GenAI
-            response = model.generate(prompt)
+            # Use the shared OpenVINO GenAI pipeline, reusing cached verdicts for repeated prompts
+            response = cached_generate(
+                get_llm_pipeline(), prompt, self.judge_config,
+                db_handler=self.db_handler, replay_only=self.replay_only
+            )
+            if response is None:
+                return None
             
             # Assuming the response is a JSON object with keys like 'Relevance' and 'Explanation'
-            evaluation = json.loads(response['text'])
+            evaluation = json.loads(response)
             return evaluation
         except Exception as e:
             print(f"Error in LLM evaluation: {str(e)}")
             return None
     
 
-    def evaluate_rag(self, rag_system, ground_truth_file, prompt_template=None):
-        try:
-            ground_truth = pd.read_csv(ground_truth_file)
-        except FileNotFoundError:
-            print("Ground truth file not found. Please generate ground truth data first.")
-            return None
+    def query_all(self, rag_system, queries, batch_size=8):
+        """Run RAG queries in batches so the pipeline schedules each batch together; results keep the input order"""
+        results = []
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            results.extend(rag_system.query_batch(
+                [question for question, _ in batch],
+                search_method='hybrid',
+                index_names=[index_name for _, index_name in batch],
+                # A near-paraphrased question must not be scored on another question's answer;
+                # exact repeats are still served from the LLM cache
+                use_semantic_cache=False
+            ))
+        return results
+
+    def load_ground_truth(self, ground_truth_file):
+        """Read the ground truth CSV as a list of row dicts"""
+        with open(ground_truth_file, newline='', encoding='utf-8') as f:
+            return list(csv.DictReader(f))
+
+    def evaluate_rag(self, rag_system, ground_truth_file, prompt_template=None, batch_size=8, ground_truth=None):
+        if ground_truth is None:
+            try:
+                ground_truth = self.load_ground_truth(ground_truth_file)
+            except FileNotFoundError:
+                print("Ground truth file not found. Please generate ground truth data first.")
+                return None
 
         evaluations = []
 
-        for _, row in tqdm(ground_truth.iterrows(), total=len(ground_truth)):
-            question = row['question']
-            video_id = row['video_id']
-            
-            index_name = self.db_handler.get_elasticsearch_index_by_youtube_id(video_id)
-            
+        # Resolve every video's index in one query
+        indices = self.db_handler.get_elasticsearch_indices_by_youtube_ids(
+            list({str(row['video_id']) for row in ground_truth})
+        )
+
+        rows = []
+        for row in ground_truth:
+            index_name = indices.get(str(row['video_id']))
             if not index_name:
-                print(f"No index found for video {video_id}. Skipping this question.")
+                print(f"No index found for video {row['video_id']}. Skipping this question.")
                 continue
+            rows.append((row, index_name))
 
-            try:
-                answer_llm, _ = rag_system.query(question, search_method='hybrid', index_name=index_name)
-            except ValueError as e:
-                print(f"Error querying RAG system: {str(e)}")
-                continue
+        # Keep each video's questions adjacent: they share the transcript context,
+        # so the pipeline's prefix cache can reuse its KV across consecutive prompts
+        rows.sort(key=lambda item: item[1])
+
+        # Retrieval runs concurrently and each batch of prompts is generated in one pipeline call
+        results = self.query_all(
+            rag_system,
+            [(row['question'], index_name) for row, index_name in rows],
+            batch_size
+        )
+
+        for (row, _), (answer_llm, _) in tqdm(zip(rows, results), total=len(rows)):
+            question = row['question']
+            video_id = row['video_id']
 
             if prompt_template:
                 evaluation = self.llm_as_judge(question, answer_llm, prompt_template)
@@ -149,37 +229,29 @@ class EvaluationSystem:
         return evaluations
 
     def save_evaluations_to_db(self, evaluations):
-        with sqlite3.connect(self.db_handler.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS rag_evaluations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                video_id TEXT,
-                question TEXT,
-                answer TEXT,
-                relevance TEXT,
-                explanation TEXT
-            )
-            ''')
-            for eval_data in evaluations:
-                cursor.execute('''
-                INSERT INTO rag_evaluations (video_id, question, answer, relevance, explanation)
-                VALUES (?, ?, ?, ?, ?)
-                ''', (eval_data['video_id'], eval_data['question'], eval_data['answer'], 
-                      eval_data['relevance'], eval_data['explanation']))
-            conn.commit()
+        self.db_handler.save_rag_evaluations(evaluations)
         print("Evaluation results saved to database")
 
-    def run_full_evaluation(self, rag_system, ground_truth_file, prompt_template=None):
-        # Load ground truth
-        ground_truth = pd.read_csv(ground_truth_file)
+    def run_full_evaluation(self, rag_system, ground_truth_file, prompt_template=None, replay_only=None):
+        # Replay-only runs re-score cached answers and verdicts without generating
+        if replay_only is not None:
+            self.replay_only = replay_only
+            rag_system.replay_only = replay_only
+
+        # Load ground truth once and share it between the evaluations
+        ground_truth = self.load_ground_truth(ground_truth_file)
 
         # Evaluate RAG
-        rag_evaluations = self.evaluate_rag(rag_system, ground_truth_file, prompt_template)
+        rag_evaluations = self.evaluate_rag(rag_system, ground_truth_file, prompt_template, ground_truth=ground_truth)
+
+        # Resolve every video's index once for the search evaluation and all optimizer trials
+        indices = self.db_handler.get_elasticsearch_indices_by_youtube_ids(
+            list({str(row['video_id']) for row in ground_truth})
+        )
 
         # Evaluate search performance
         def search_function(query, video_id):
-            index_name = self.db_handler.get_elasticsearch_index_by_youtube_id(video_id)
+            index_name = indices.get(str(video_id))
             if index_name:
                 return rag_system.data_processor.search(query, num_results=10, method='hybrid', index_name=index_name)
             return []
@@ -191,7 +263,7 @@ class EvaluationSystem:
 
         def objective_function(params):
             def parameterized_search(query, video_id):
-                index_name = self.db_handler.get_elasticsearch_index_by_youtube_id(video_id)
+                index_name = indices.get(str(video_id))
                 if index_name:
                     return rag_system.data_processor.search(query, num_results=10, method='hybrid', index_name=index_name, boost_dict=params)
                 return []
@@ -208,9 +280,13 @@ class EvaluationSystem:
 
 
     def hit_rate(self, relevance_total):
+        if not relevance_total:
+            return 0.0
         return sum(any(line) for line in relevance_total) / len(relevance_total)
 
     def mrr(self, relevance_total):
+        if not relevance_total:
+            return 0.0
         scores = []
         for line in relevance_total:
             for rank, relevant in enumerate(line, 1):
@@ -222,24 +298,26 @@ class EvaluationSystem:
         return sum(scores) / len(scores)
 
     def simple_optimize(self, param_ranges, objective_function, n_iterations=10):
-        best_params = None
-        best_score = float('-inf')
-        for _ in range(n_iterations):
-            current_params = {param: np.random.uniform(min_val, max_val) 
-                              for param, (min_val, max_val) in param_ranges.items()}
-            current_score = objective_function(current_params)
-            if current_score > best_score:
-                best_score = current_score
-                best_params = current_params
-        return best_params, best_score
-
-    def evaluate_search(self, ground_truth, search_function):
-        relevance_total = []
-        for _, row in tqdm(ground_truth.iterrows(), total=len(ground_truth)):
+        """Maximize the objective over the parameter ranges with Optuna's TPE sampler"""
+        study = optuna.create_study(direction='maximize', sampler=optuna.samplers.TPESampler(seed=1))
+        study.optimize(
+            lambda trial: objective_function({
+                param: trial.suggest_float(param, min_val, max_val)
+                for param, (min_val, max_val) in param_ranges.items()
+            }),
+            n_trials=n_iterations
+        )
+        return study.best_params, study.best_value
+
+    def evaluate_search(self, ground_truth, search_function, max_workers=8):
+        """Run searches concurrently (they are IO-bound on Elasticsearch); results keep the ground truth order"""
+        def search_relevance(row):
             video_id = row['video_id']
             results = search_function(row['question'], video_id)
-            relevance = [d['video_id'] == video_id for d in results]
-            relevance_total.append(relevance)
+            return [d['video_id'] == video_id for d in results]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            relevance_total = list(tqdm(executor.map(search_relevance, ground_truth), total=len(ground_truth)))
         return {
             'hit_rate': self.hit_rate(relevance_total),
             'mrr': self.mrr(relevance_total),
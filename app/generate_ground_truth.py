@@ -2,7 +2,7 @@ import pandas as pd
 import json
 from tqdm import tqdm
 # import ollama
-import openvino_genai as ov_genai
+from llm import get_llm_pipeline, GENERATE_LOCK
 from elasticsearch import Elasticsearch
 import sqlite3
 import logging
@@ -75,15 +75,14 @@ def generate_questions(transcript, max_retries=3):
             #     messages=[{"role": "user", "content": prompt}]
             # )
          
-            # Corrected: Using OpenVINO GenAI for question generation
-            model_path = os.getenv('OPENVINO_MODEL_PATH', '/app/models/Phi-3-mini-128k-instruct-int4-ov')  # Model path environment variable
-            device = os.getenv('OPENVINO_DEVICE', 'CPU')  # Device to run on (e.g., 'CPU', 'GPU')
-            model = ov_genai.load_model(model_path, device=device)  # Load the OpenVINO GenAI model
+            # Using the shared OpenVINO GenAI pipeline for question generation
+            model = get_llm_pipeline()
 
             # Generate the response using OpenVINO GenAI
-            response = model.generate(prompt)  # Corrected: Generate questions based on the prompt using OpenVINO GenAI
+            with GENERATE_LOCK:
+                response = model.generate(prompt, max_new_tokens=512)
                      
-            questions = json.loads(response['message']['content'])['questions']
+            questions = json.loads(str(response))['questions']
             all_questions.update(questions)
         except Exception as e:
             logger.error(f"Error generating questions: {str(e)}")
@@ -94,17 +93,19 @@ def generate_questions(transcript, max_retries=3):
 
     return {"questions": list(all_questions)[:10]}
 
-def generate_ground_truth(db_handler, data_processor, video_id):
-    es = Elasticsearch([f'http://{os.getenv("ELASTICSEARCH_HOST", "localhost")}:{os.getenv("ELASTICSEARCH_PORT", "9200")}'])
+def generate_ground_truth(db_handler, data_processor, video_id, transcript=None):
+    # Reuse the DataProcessor's client and its connection pool rather than opening a new one per video
+    es = getattr(data_processor, 'es', None)
+    if es is None:
+        es = Elasticsearch([f'http://{os.getenv("ELASTICSEARCH_HOST", "localhost")}:{os.getenv("ELASTICSEARCH_PORT", "9200")}'])
     
     # Get existing questions for this video to avoid duplicates
     existing_questions = set(q[1] for q in db_handler.get_ground_truth_by_video(video_id))
     
-    transcript = None
-    index_name = db_handler.get_elasticsearch_index_by_youtube_id(video_id)
-    
-    if index_name:
-        transcript = get_transcript_from_elasticsearch(es, index_name, video_id)
+    if not transcript:
+        index_name = db_handler.get_elasticsearch_index_by_youtube_id(video_id)
+        if index_name:
+            transcript = get_transcript_from_elasticsearch(es, index_name, video_id)
     
     if not transcript:
         transcript = db_handler.get_transcript_content(video_id)
@@ -193,9 +194,12 @@ def generate_ground_truth_for_all_videos(db_handler, data_processor):
     videos = db_handler.get_all_videos()
     all_questions = []
 
+    # Read every stored transcript up front in one batch instead of one lookup per video
+    transcripts = db_handler.get_transcripts_content(video[0] for video in videos)
+
     for video in tqdm(videos, desc="Generating ground truth"):
         video_id = video[0]  # Assuming the video ID is the first element in the tuple
-        df = generate_ground_truth(db_handler, data_processor, video_id)
+        df = generate_ground_truth(db_handler, data_processor, video_id, transcript=transcripts.get(video_id))
         if df is not None:
             all_questions.extend(df.values.tolist())
 
@@ -0,0 +1,146 @@
+import os
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from pathlib import Path
+import streamlit as st
+import openvino as ov
+import openvino_genai as ov_genai
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = os.getenv('OPENVINO_MODEL_PATH', '/app/models/Phi-3-mini-128k-instruct-int4-ov')
+DEFAULT_DEVICE = os.getenv('OPENVINO_DEVICE', 'AUTO:GPU,CPU')
+
+# LATENCY suits interactive chat; THROUGHPUT suits long batch evaluation runs
+PERFORMANCE_HINT = os.getenv('OPENVINO_PERFORMANCE_HINT', 'LATENCY').upper()
+
+# Prefix caching keeps the KV cache of shared prompt prefixes (e.g. the same
+# transcript context asked several questions) so later prompts skip their prefill
+ENABLE_PREFIX_CACHING = os.getenv('OPENVINO_PREFIX_CACHING', 'true').lower() in ('1', 'true', 'yes')
+KV_CACHE_SIZE_GB = int(os.getenv('OPENVINO_KV_CACHE_SIZE', '2'))
+
+# Decode is bound by reading the KV cache; u8 halves its size versus f16
+KV_CACHE_PRECISION = os.getenv('OPENVINO_KV_CACHE_PRECISION', 'u8')
+# Activations of the int4 weight matmuls are quantized on the fly in groups of this size (CPU only)
+DYNAMIC_QUANTIZATION_GROUP_SIZE = os.getenv('OPENVINO_DYNAMIC_QUANTIZATION_GROUP_SIZE', '32')
+
+# Compiled model blobs are written here so later process starts skip recompilation
+CACHE_DIR = os.getenv('OPENVINO_CACHE_DIR', '/app/models/.ov_cache')
+
+@lru_cache(maxsize=None)
+def resolve_device(device):
+    """Pick the first available device from an AUTO:<candidates> list; resolved once per device string"""
+    if not device.upper().startswith('AUTO:'):
+        return device
+    available = ov.Core().available_devices
+    for candidate in device.split(':', 1)[1].split(','):
+        candidate = candidate.strip().upper()
+        if any(name.split('.')[0] == candidate for name in available):
+            return candidate
+    logger.warning(f"None of {device} available (found {available}), falling back to CPU")
+    return 'CPU'
+
+def get_device_properties(device):
+    """Compile properties for the pipeline on the given device"""
+    properties = {'PERFORMANCE_HINT': PERFORMANCE_HINT}
+    if CACHE_DIR:
+        properties['CACHE_DIR'] = CACHE_DIR
+    if PERFORMANCE_HINT == 'LATENCY':
+        properties['NUM_STREAMS'] = '1'
+    else:
+        properties['NUM_STREAMS'] = 'AUTO'
+    if device == 'CPU':
+        # Keep inference threads pinned to physical cores; with the LATENCY hint the
+        # CPU plugin also confines them to one NUMA node to avoid cross-socket traffic
+        properties['INFERENCE_NUM_THREADS'] = max(1, (os.cpu_count() or 2) // 2)
+        properties['ENABLE_CPU_PINNING'] = True
+        if KV_CACHE_PRECISION:
+            properties['KV_CACHE_PRECISION'] = KV_CACHE_PRECISION
+        if DYNAMIC_QUANTIZATION_GROUP_SIZE:
+            properties['DYNAMIC_QUANTIZATION_GROUP_SIZE'] = DYNAMIC_QUANTIZATION_GROUP_SIZE
+    return properties
+
+def get_scheduler_config():
+    """Scheduler config enabling prefix caching, or None when it is turned off"""
+    if not ENABLE_PREFIX_CACHING:
+        return None
+    scheduler_config = ov_genai.SchedulerConfig()
+    scheduler_config.enable_prefix_caching = True
+    scheduler_config.cache_size = KV_CACHE_SIZE_GB
+    return scheduler_config
+
+# The pipeline is shared process-wide and runs one generation at a time;
+# every pipe.generate call must hold this lock
+GENERATE_LOCK = threading.Lock()
+
+def get_llm_pipeline(model_path=DEFAULT_MODEL_PATH, device=DEFAULT_DEVICE):
+    """Return the OpenVINO LLM pipeline shared between components"""
+    # st.cache_resource keys on the arguments as passed, so normalize them first:
+    # every caller asking for the same model and device must hit the same entry
+    return _load_llm_pipeline(str(Path(model_path)), resolve_device(device))
+
+@st.cache_resource(show_spinner=False)
+def _load_llm_pipeline(model_path, device):
+    """Load the OpenVINO LLM pipeline once per process"""
+    logger.info(f"Loading OpenVINO pipeline from {model_path} on {device}")
+    properties = get_device_properties(device)
+    if CACHE_DIR:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+        except OSError as e:
+            # The compile cache is optional; outside the Docker image the default path may not be writable
+            logger.warning(f"Cannot create OpenVINO cache dir {CACHE_DIR}, compiling without it: {str(e)}")
+            properties.pop('CACHE_DIR', None)
+    scheduler_config = get_scheduler_config()
+    if scheduler_config is not None:
+        properties['scheduler_config'] = scheduler_config
+        logger.info(f"Prefix caching enabled with {KV_CACHE_SIZE_GB} GB KV cache")
+    pipe = ov_genai.LLMPipeline(model_path, device, **properties)
+    logger.info("OpenVINO pipeline loaded")
+    warm_up_pipeline(pipe)
+    return pipe
+
+def generation_cache_key(model_path, prompt, config):
+    """Content-addressed LLM cache key covering the model, the generation settings and the prompt"""
+    settings = (config.max_new_tokens, config.temperature, config.top_p, config.top_k,
+                config.repetition_penalty, config.do_sample)
+    return hashlib.sha256(f"{model_path}|{settings!r}|{prompt}".encode('utf-8')).hexdigest()
+
+def make_generation_config(max_new_tokens=512, **settings):
+    """GenerationConfig with the given token budget and sampling settings"""
+    config = ov_genai.GenerationConfig()
+    config.max_new_tokens = max_new_tokens
+    for name, value in settings.items():
+        setattr(config, name, value)
+    return config
+
+def cached_generate(pipe, prompt, config, model_path=DEFAULT_MODEL_PATH, db_handler=None, replay_only=False):
+    """Generate a response, serving repeated prompts from the LLM cache when a db_handler is given;
+    returns None on a cache miss in replay-only mode"""
+    cache_key = None
+    if db_handler is not None:
+        cache_key = generation_cache_key(model_path, prompt, config)
+        cached = db_handler.get_llm_cache(cache_key)
+        if cached is not None:
+            logger.info("Serving response from LLM cache")
+            return cached
+        if replay_only:
+            logger.warning("LLM cache miss in replay-only mode, skipping generation")
+            return None
+
+    with GENERATE_LOCK:
+        response = str(pipe.generate(prompt, config))
+    if cache_key is not None:
+        db_handler.add_llm_cache(cache_key, response)
+    return response
+
+def warm_up_pipeline(pipe):
+    """Run a one-token generation so tokenizer setup and first-inference cost is paid at load time"""
+    try:
+        with GENERATE_LOCK:
+            pipe.generate("warmup", max_new_tokens=1)
+        logger.info("OpenVINO pipeline warmed up")
+    except Exception as e:
+        logger.warning(f"Pipeline warm-up failed: {str(e)}")
@@ -7,11 +7,10 @@ st.set_page_config(
     layout="wide"
 )
 
-import pandas as pd
-from transcript_extractor import get_transcript, extract_video_id, get_channel_videos
+from transcript_extractor import extract_video_id, get_channel_videos, CHANNEL_MAX_VIDEOS
 from database import DatabaseHandler
 from data_processor import DataProcessor
-from utils import process_single_video
+from utils import process_single_video, process_multiple_videos, load_video_count, load_video_channels, select_videos_page, clear_video_caches
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,17 +19,13 @@ logger = logging.getLogger(__name__)
 def init_components():
     return DatabaseHandler(), DataProcessor()
 
-def process_multiple_videos(db_handler, data_processor, video_ids, embedding_model):
-    progress_bar = st.progress(0)
-    processed = 0
-    total = len(video_ids)
-    
-    for video_id in video_ids:
-        if process_single_video(db_handler, data_processor, video_id, embedding_model):
-            processed += 1
-        progress_bar.progress(processed / total)
-    
-    st.success(f"Processed {processed} out of {total} videos")
+def process_video(db_handler, data_processor, video_id, embedding_model):
+    index_name = process_single_video(db_handler, data_processor, video_id, embedding_model)
+    if index_name:
+        st.success(f"Video {video_id} is indexed as {index_name}")
+    else:
+        st.error(f"Failed to process video {video_id}. Check the logs for details.")
+    return index_name
 
 def main():
     st.title("Data Ingestion 📥")
@@ -45,15 +40,14 @@ def main():
     
     # Display existing videos
     st.header("Processed Videos")
-    videos = db_handler.get_all_videos()
-    if videos:
-        video_df = pd.DataFrame(videos, columns=['youtube_id', 'title', 'channel_name', 'upload_date'])
-        channels = sorted(video_df['channel_name'].unique())
+    if load_video_count(db_handler):
+        channels = load_video_channels(db_handler)
         
         selected_channel = st.selectbox("Filter by Channel", ["All"] + channels)
-        if selected_channel != "All":
-            video_df = video_df[video_df['channel_name'] == selected_channel]
+        channel_filter = None if selected_channel == "All" else selected_channel
         
+        # Only the visible page is loaded from the database
+        video_df = select_videos_page(db_handler, channel_filter, key="videos_page")
         st.dataframe(video_df)
     else:
         st.info("No videos processed yet. Use the form below to add videos.")
@@ -63,6 +57,13 @@ def main():
     with st.form("process_video_form"):
         input_type = st.radio("Select input type:", ["Video URL", "Channel URL", "YouTube ID"])
         input_value = st.text_input("Enter the URL or ID:")
+        max_videos = st.number_input(
+            "Maximum videos to process from a channel:",
+            min_value=1,
+            max_value=1000,
+            value=CHANNEL_MAX_VIDEOS,
+            help="The channel's newest uploads are listed until this many are found"
+        )
         submit_button = st.form_submit_button("Process")
         
         if submit_button:
@@ -72,10 +73,10 @@ def main():
                 if input_type == "Video URL":
                     video_id = extract_video_id(input_value)
                     if video_id:
-                        process_single_video(db_handler, data_processor, video_id, embedding_model)
+                        process_video(db_handler, data_processor, video_id, embedding_model)
                 
                 elif input_type == "Channel URL":
-                    channel_videos = get_channel_videos(input_value)
+                    channel_videos = get_channel_videos(input_value, max_videos=int(max_videos))
                     if channel_videos:
                         video_ids = [video['video_id'] for video in channel_videos]
                         process_multiple_videos(db_handler, data_processor, video_ids, embedding_model)
@@ -83,63 +84,10 @@ def main():
                         st.error("Failed to retrieve videos from the channel")
                 
                 else:  # YouTube ID
-                    process_single_video(db_handler, data_processor, input_value, embedding_model)
-
-def process_single_video(db_handler, data_processor, video_id, embedding_model):
-    try:
-        existing_index = db_handler.get_elasticsearch_index_by_youtube_id(video_id)
-        if existing_index:
-            st.info(f"Video {video_id} already processed. Using existing index.")
-            return existing_index
-        
-        transcript_data = get_transcript(video_id)
-        if not transcript_data:
-            st.error("Failed to retrieve transcript.")
-            return None
-            
-        # Process transcript and create indices
-        processed_data = data_processor.process_transcript(video_id, transcript_data)
-        if not processed_data:
-            st.error("Failed to process transcript.")
-            return None
+                    process_video(db_handler, data_processor, input_value, embedding_model)
             
-        # Save to database and create index
-        video_data = {
-            'video_id': video_id,
-            'title': transcript_data['metadata'].get('title', 'Unknown'),
-            'author': transcript_data['metadata'].get('author', 'Unknown'),
-            'upload_date': transcript_data['metadata'].get('upload_date', ''),
-            'view_count': transcript_data['metadata'].get('view_count', 0),
-            'like_count': transcript_data['metadata'].get('like_count', 0),
-            'comment_count': transcript_data['metadata'].get('comment_count', 0),
-            'video_duration': transcript_data['metadata'].get('duration', ''),
-            'transcript_content': processed_data['content']
-        }
-        
-        db_handler.add_video(video_data)
-        
-        index_name = f"video_{video_id}_{embedding_model}".lower()
-        index_name = data_processor.build_index(index_name)
-        
-        if index_name:
-            st.success(f"Successfully processed video: {video_data['title']}")
-            return index_name
-    except Exception as e:
-        st.error(f"Error processing video: {str(e)}")
-        logger.error(f"Error processing video {video_id}: {str(e)}")
-        return None
-
-def process_multiple_videos(db_handler, data_processor, video_ids, embedding_model):
-    progress_bar = st.progress(0)
-    processed = 0
-    total = len(video_ids)
-    
-    for video_id in video_ids:
-        if process_single_video(db_handler, data_processor, video_id, embedding_model):
-            processed += 1
-        progress_bar.progress(processed / total)
-    
-    st.success(f"Processed {processed} out of {total} videos")
+            # New videos may have been added; drop the cached video listings
+            clear_video_caches()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -6,12 +6,14 @@ st.set_page_config(
     layout="wide"
 )
 
+import os
 import pandas as pd
 from database import DatabaseHandler
 from data_processor import DataProcessor
 from rag import RAGSystem
 from evaluation import EvaluationSystem
 from generate_ground_truth import get_evaluation_display_data
+from utils import to_csv_bytes
 import logging
 
 logger = logging.getLogger(__name__)
@@ -43,11 +45,16 @@ Requirements:
 4. Return valid JSON only
 """.strip()
 
+@st.cache_data(ttl=30, show_spinner=False)
+def load_evaluation_display_data(video_id=None):
+    """Evaluation results for display, cached across reruns"""
+    return get_evaluation_display_data(video_id)
+
 @st.cache_resource
 def init_components():
     db_handler = DatabaseHandler()
     data_processor = DataProcessor()
-    rag_system = RAGSystem(data_processor)
+    rag_system = RAGSystem(data_processor, db_handler=db_handler)
     evaluation_system = EvaluationSystem(data_processor, db_handler)
     return db_handler, data_processor, rag_system, evaluation_system
 
@@ -57,18 +64,19 @@ def main():
     db_handler, data_processor, rag_system, evaluation_system = init_components()
     
     try:
-        # Check for ground truth data
-        ground_truth_df = pd.read_csv('data/ground-truth-retrieval.csv')
+        # Check for ground truth data; only the file is checked, it is parsed when an evaluation runs
+        if not os.path.exists('data/ground-truth-retrieval.csv') or os.path.getsize('data/ground-truth-retrieval.csv') == 0:
+            raise FileNotFoundError('data/ground-truth-retrieval.csv')
         ground_truth_available = True
         
         # Display existing evaluations
-        existing_evaluations = get_evaluation_display_data()
+        existing_evaluations = load_evaluation_display_data()
         if not existing_evaluations.empty:
             st.subheader("Existing Evaluation Results")
             st.dataframe(existing_evaluations)
             
             # Download button for evaluation results
-            csv = existing_evaluations.to_csv(index=False)
+            csv = to_csv_bytes(existing_evaluations)
             st.download_button(
                 label="Download Evaluation Results",
                 data=csv,
@@ -78,16 +86,24 @@ def main():
         
         # Run evaluation
         if ground_truth_available:
+            replay_only = st.checkbox(
+                "Replay cached LLM responses only",
+                help="Re-score answers and verdicts from earlier runs without calling the model"
+            )
             if st.button("Run Full Evaluation"):
                 with st.spinner("Running evaluation..."):
                     try:
                         evaluation_results = evaluation_system.run_full_evaluation(
                             rag_system,
                             'data/ground-truth-retrieval.csv',
-                            EVALUATION_PROMPT_TEMPLATE
+                            EVALUATION_PROMPT_TEMPLATE,
+                            replay_only=replay_only
                         )
                         
                         if evaluation_results:
+                            # New results were written; drop the cached display data
+                            load_evaluation_display_data.clear()
+                            
                             # Display RAG evaluations
                             st.subheader("RAG Evaluations")
                             rag_eval_df = pd.DataFrame(evaluation_results["rag_evaluations"])
@@ -6,14 +6,19 @@ st.set_page_config(
     layout="wide"
 )
 
-import pandas as pd
 from database import DatabaseHandler
 from data_processor import DataProcessor
 from generate_ground_truth import generate_ground_truth, get_ground_truth_display_data
+from utils import load_video_count, load_video_channels, select_videos_page, to_csv_bytes
 import logging
 
 logger = logging.getLogger(__name__)
 
+@st.cache_data(ttl=30, show_spinner=False)
+def load_ground_truth_display_data(_db_handler, video_id=None, channel_name=None):
+    """Ground truth questions for display, cached across reruns"""
+    return get_ground_truth_display_data(_db_handler, video_id=video_id, channel_name=channel_name)
+
 @st.cache_resource
 def init_components():
     return DatabaseHandler(), DataProcessor()
@@ -23,28 +28,25 @@ def main():
     
     db_handler, data_processor = init_components()
     
-    # Get all videos
-    videos = db_handler.get_all_videos()
-    if not videos:
+    # Check for videos
+    if not load_video_count(db_handler):
         st.warning("No videos available. Please process some videos in the Data Ingestion page first.")
         return
     
-    video_df = pd.DataFrame(videos, columns=['youtube_id', 'title', 'channel_name', 'upload_date'])
-    
     # Channel filter
-    channels = sorted(video_df['channel_name'].unique())
+    channels = load_video_channels(db_handler)
     selected_channel = st.selectbox("Filter by Channel", ["All"] + channels)
+    channel_filter = None if selected_channel == "All" else selected_channel
     
-    if selected_channel != "All":
-        video_df = video_df[video_df['channel_name'] == selected_channel]
+    if channel_filter:
         # Display existing ground truth for channel
-        gt_data = get_ground_truth_display_data(db_handler, channel_name=selected_channel)
+        gt_data = load_ground_truth_display_data(db_handler, channel_name=selected_channel)
         if not gt_data.empty:
             st.subheader("Existing Ground Truth Questions for Channel")
             st.dataframe(gt_data)
             
             # Download button for channel ground truth
-            csv = gt_data.to_csv(index=False)
+            csv = to_csv_bytes(gt_data)
             st.download_button(
                 label="Download Channel Ground Truth CSV",
                 data=csv,
@@ -53,6 +55,8 @@ def main():
             )
     
     st.subheader("Available Videos")
+    # Only the visible page is loaded from the database
+    video_df = select_videos_page(db_handler, channel_filter, key="videos_page")
     st.dataframe(video_df)
     
     # Video selection
@@ -73,6 +77,8 @@ def main():
                         selected_video_id
                     )
                     if questions_df is not None and not questions_df.empty:
+                        # New questions were written; drop the cached display data
+                        load_ground_truth_display_data.clear()
                         st.success("Successfully generated ground truth questions")
                         st.dataframe(questions_df)
                     else:
@@ -82,13 +88,13 @@ def main():
                     logger.error(f"Error in ground truth generation: {str(e)}")
         
         # Display existing ground truth
-        gt_data = get_ground_truth_display_data(db_handler, video_id=selected_video_id)
+        gt_data = load_ground_truth_display_data(db_handler, video_id=selected_video_id)
         if not gt_data.empty:
             st.subheader("Existing Ground Truth Questions")
             st.dataframe(gt_data)
             
             # Download button for video ground truth
-            csv = gt_data.to_csv(index=False)
+            csv = to_csv_bytes(gt_data)
             st.download_button(
                 label="Download Ground Truth CSV",
                 data=csv,
@@ -1,7 +1,7 @@
 import os
 # import ollama
-import openvino_genai as ov_genai
 import logging
+from llm import get_llm_pipeline, DEFAULT_DEVICE, GENERATE_LOCK
 
 logger = logging.getLogger(__name__)
 
@@ -12,12 +12,11 @@ class QueryRewriter:
         
         # Get the model path and device from environment variables
         self.model_path = os.getenv('OPENVINO_MODEL_PATH', '/app/models/Phi-3-mini-128k-instruct-int4-ov')
-        self.device = os.getenv('OPENVINO_DEVICE', 'CPU')
+        self.device = DEFAULT_DEVICE
 
-        # Load the OpenVINO model
+        # Reuse the process-wide OpenVINO pipeline shared with RAGSystem
         try:
-            # self.model = ov_genai.load_model(self.model_path, device=self.device)
-            self.model = ov_genai.LLMPipeline(self.model_path, self.device)
+            self.pipe = get_llm_pipeline(self.model_path, self.device)
         except Exception as e:
             logger.error(f"Error loading OpenVINO model: {e}")
             raise
@@ -25,11 +24,9 @@ class QueryRewriter:
 
     def generate(self, prompt):
         try:
-            response = ollama.chat(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            return response['message']['content']
+            with GENERATE_LOCK:
+                response = self.pipe.generate(prompt, max_new_tokens=512)
+            return str(response)
         except Exception as e:
             logger.error(f"Error generating response: {e}")
             return f"Error: {str(e)}"
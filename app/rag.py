@@ -1,9 +1,13 @@
 import os
 from dotenv import load_dotenv
 import logging
+import queue
+import threading
 import time
-import openvino_genai as ov_genai
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from pathlib import Path
+from llm import get_llm_pipeline, cached_generate, generation_cache_key, make_generation_config, DEFAULT_DEVICE, GENERATE_LOCK
 
 load_dotenv()
 
@@ -29,24 +33,75 @@ Guidelines:
 5. Use natural, conversational language
 """.strip()
 
+# Static text around the two placeholders, split once so building a prompt is plain concatenation
+_RAG_PROMPT_PREFIX, _rest = RAG_PROMPT_TEMPLATE.split('{context}')
+_RAG_PROMPT_MIDDLE, _RAG_PROMPT_SUFFIX = _rest.split('{question}')
+del _rest
+
+class SemanticCache:
+    """Approximate answer cache: a query whose embedding is within tau cosine distance of a cached one reuses its answer"""
+    def __init__(self, capacity=1024, tau=0.05):
+        self.capacity = capacity
+        self.tau = tau
+        self._keys = None
+        self._scopes = np.empty(capacity, dtype=object)
+        self._values = [None] * capacity
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def get(self, embedding, scope):
+        """Return the cached value nearest to the embedding within the same scope, or None"""
+        with self._lock:
+            if self._size == 0:
+                return None
+            distances = 1.0 - self._keys[:self._size] @ embedding
+            distances[self._scopes[:self._size] != scope] = np.inf
+            best = int(np.argmin(distances))
+            if distances[best] <= self.tau:
+                return self._values[best]
+            return None
+
+    def put(self, embedding, scope, value):
+        """Store a value, overwriting the oldest entry once the cache is full"""
+        with self._lock:
+            if self._keys is None:
+                self._keys = np.zeros((self.capacity, embedding.shape[0]), dtype=np.float32)
+            self._keys[self._next] = embedding
+            self._scopes[self._next] = scope
+            self._values[self._next] = value
+            self._next = (self._next + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
 class RAGSystem:
-    def __init__(self, data_processor):
+    def __init__(self, data_processor, db_handler=None, replay_only=False):
         """Initialize the RAG system with model loading and error handling"""
         try:
             self.data_processor = data_processor
+
+            # Optional persistent LLM response cache; replay_only serves cached
+            # responses without calling the model (for metric iteration runs)
+            self.db_handler = db_handler
+            self.replay_only = replay_only
+
+            # Near-duplicate queries skip both retrieval and generation
+            self.semantic_cache = SemanticCache()
             
             # Get model path from environment or use default
             model_base = os.getenv('OPENVINO_MODEL_PATH', '/app/models/Phi-3-mini-128k-instruct-int4-ov')
             self.model_path = self._verify_model_path(model_base)
             
             # Get device from environment or use default
-            self.device = os.getenv('OPENVINO_DEVICE', 'CPU')
+            self.device = DEFAULT_DEVICE
             
             logger.info(f"Initializing OpenVINO pipeline with model: {self.model_path}")
             logger.info(f"Using device: {self.device}")
             
             # Initialize the OpenVINO pipeline with retry logic
             self.pipe = self._initialize_pipeline()
+
+            # Build the generation settings once instead of passing kwargs on every call
+            self.generation_config = self._build_generation_config()
             
             logger.info("RAG System initialized successfully")
             
@@ -84,7 +139,7 @@ class RAGSystem:
         
         for attempt in range(max_retries):
             try:
-                pipe = ov_genai.LLMPipeline(self.model_path, self.device)
+                pipe = get_llm_pipeline(self.model_path, self.device)
                 logger.info(f"Successfully initialized pipeline on attempt {attempt + 1}")
                 return pipe
             except Exception as e:
@@ -95,18 +150,24 @@ class RAGSystem:
         
         raise RuntimeError(f"Failed to initialize pipeline after {max_retries} attempts: {str(last_error)}")
 
+    def _build_generation_config(self):
+        """Generation settings shared by every call"""
+        return make_generation_config(512, temperature=0.7, top_p=0.95, repetition_penalty=1.1)
+
+    def _cache_key(self, prompt):
+        """LLM cache key for a prompt on the loaded model with the shared generation settings"""
+        return generation_cache_key(self.model_path, prompt, self.generation_config)
+
     def generate(self, prompt, max_retries=3):
-        """Generate response with retry logic"""
+        """Generate response with retry logic, serving repeated prompts from the LLM cache"""
         for attempt in range(max_retries):
             try:
-                response = self.pipe.generate(
-                    prompt,
-                    max_length=2000,
-                    temperature=0.7,
-                    top_p=0.95,
-                    repetition_penalty=1.1
+                response = cached_generate(
+                    self.pipe, prompt, self.generation_config,
+                    model_path=self.model_path, db_handler=self.db_handler, replay_only=self.replay_only
                 )
-                logger.info("Successfully generated response")
+                if response is not None:
+                    logger.info("Successfully generated response")
                 return response
             except Exception as e:
                 logger.warning(f"Generation attempt {attempt + 1} failed: {str(e)}")
@@ -115,41 +176,141 @@ class RAGSystem:
                     return None
                 time.sleep(2 ** attempt)  # Exponential backoff
 
-    def get_prompt(self, user_query, relevant_docs):
-        """Format prompt with context and query"""
+    def generate_stream(self, prompt):
+        """Yield the response in chunks as it is decoded; raises if generation fails"""
+        cache_key = None
+        if self.db_handler is not None:
+            cache_key = self._cache_key(prompt)
+            cached = self.db_handler.get_llm_cache(cache_key)
+            if cached is not None:
+                logger.info("Serving response from LLM cache")
+                yield cached
+                return
+            if self.replay_only:
+                logger.warning("LLM cache miss in replay-only mode, skipping generation")
+                return
+
+        chunks = queue.Queue()
+        done = object()
+        result = []
+
+        def run():
+            try:
+                with GENERATE_LOCK:
+                    result.append(str(self.pipe.generate(
+                        prompt,
+                        self.generation_config,
+                        streamer=lambda subword: chunks.put(subword) or False
+                    )))
+                chunks.put(done)
+            except Exception as e:
+                chunks.put(e)
+
+        # Decode runs in the background while chunks are handed to the caller
+        threading.Thread(target=run, daemon=True).start()
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+        logger.info("Successfully generated response")
+        if cache_key is not None:
+            self.db_handler.add_llm_cache(cache_key, result[0])
+
+    def generate_batch(self, prompts, max_retries=3):
+        """Generate responses for several prompts in one pipeline call so the scheduler batches them"""
+        responses = [None] * len(prompts)
+        pending = list(range(len(prompts)))
+
+        if self.db_handler is not None:
+            cache_keys = [self._cache_key(prompt) for prompt in prompts]
+            pending = []
+            for i, cache_key in enumerate(cache_keys):
+                responses[i] = self.db_handler.get_llm_cache(cache_key)
+                if responses[i] is None:
+                    pending.append(i)
+            if self.replay_only:
+                if pending:
+                    logger.warning(f"{len(pending)} LLM cache misses in replay-only mode, skipping generation")
+                return responses
+
+        if not pending:
+            return responses
+
+        for attempt in range(max_retries):
+            try:
+                with GENERATE_LOCK:
+                    results = self.pipe.generate([prompts[i] for i in pending], self.generation_config)
+                for i, text in zip(pending, results.texts):
+                    responses[i] = text
+                    if self.db_handler is not None:
+                        self.db_handler.add_llm_cache(cache_keys[i], text)
+                logger.info(f"Successfully generated {len(pending)} responses in one batch")
+                return responses
+            except Exception as e:
+                logger.warning(f"Batch generation attempt {attempt + 1} failed: {str(e)}")
+                if attempt == max_retries - 1:
+                    logger.error("All batch generation attempts failed")
+                    return responses
+                time.sleep(2 ** attempt)  # Exponential backoff
+
+    def get_prompt(self, user_query, context):
+        """Format prompt with the joined context string and query"""
         try:
-            context = "\n".join([doc.get('content', '') for doc in relevant_docs])
-            return RAG_PROMPT_TEMPLATE.format(
-                context=context,
-                question=user_query
-            )
+            return _RAG_PROMPT_PREFIX + context + _RAG_PROMPT_MIDDLE + user_query + _RAG_PROMPT_SUFFIX
         except Exception as e:
             logger.error(f"Error formatting prompt: {str(e)}")
             raise
 
-    def query(self, user_query, search_method='hybrid', index_name=None):
+    def _embed_queries(self, user_queries):
+        """Unit-normalized float32 query embeddings for the semantic cache"""
+        return np.asarray(
+            self.data_processor.embedding_model.encode(user_queries, normalize_embeddings=True),
+            dtype=np.float32
+        )
+
+    def retrieve_prompt(self, user_query, search_method='hybrid', index_name=None, query_vector=None):
+        """Retrieve context for a query and build its prompt; returns None when nothing relevant is found.
+        query_vector is the query's embedding when the caller already has one."""
+        if not index_name:
+            raise ValueError("No index name provided. Please select a video and ensure it has been processed.")
+
+        # Get relevant documents
+        context, relevant_docs = self.data_processor.search(
+            user_query, 
+            num_results=3, 
+            method=search_method, 
+            index_name=index_name,
+            join_with="\n",
+            query_vector=query_vector
+        )
+        
+        if not relevant_docs:
+            logger.warning("No relevant documents found for the query")
+            return None
+
+        return self.get_prompt(user_query, context)
+
+    def query(self, user_query, search_method='hybrid', index_name=None, use_semantic_cache=True):
         """Process query and generate response"""
         try:
-            if not index_name:
-                raise ValueError("No index name provided. Please select a video and ensure it has been processed.")
-
-            # Get relevant documents
-            relevant_docs = self.data_processor.search(
-                user_query, 
-                num_results=3, 
-                method=search_method, 
-                index_name=index_name
-            )
-            
-            if not relevant_docs:
-                logger.warning("No relevant documents found for the query")
+            embedding, cached = self._semantic_lookup(user_query, search_method, index_name, use_semantic_cache)
+            if cached is not None:
+                return cached
+
+            prompt = self.retrieve_prompt(user_query, search_method, index_name, embedding)
+            if prompt is None:
                 return "I couldn't find any relevant information to answer your query.", ""
 
             # Generate and validate response
-            prompt = self.get_prompt(user_query, relevant_docs)
             answer = self.generate(prompt)
             
             if answer is not None:
+                if embedding is not None and use_semantic_cache:
+                    self.semantic_cache.put(embedding, f"{index_name}|{search_method}", (answer, prompt))
                 return answer, prompt
             else:
                 logger.error("Failed to generate response")
@@ -159,6 +320,89 @@ class RAGSystem:
             logger.error(f"Error in query processing: {str(e)}")
             return f"An error occurred: {str(e)}", ""
 
+    def query_stream(self, user_query, search_method='hybrid', index_name=None):
+        """Process query and yield the answer in chunks as it is generated"""
+        try:
+            embedding, cached = self._semantic_lookup(user_query, search_method, index_name)
+            if cached is not None:
+                yield cached[0]
+                return
+
+            prompt = self.retrieve_prompt(user_query, search_method, index_name, embedding)
+            if prompt is None:
+                yield "I couldn't find any relevant information to answer your query."
+                return
+
+            parts = []
+            for chunk in self.generate_stream(prompt):
+                parts.append(chunk)
+                yield chunk
+
+            if not parts:
+                logger.error("Failed to generate response")
+                yield "An error occurred while generating the answer."
+            elif embedding is not None:
+                self.semantic_cache.put(embedding, f"{index_name}|{search_method}", ("".join(parts), prompt))
+
+        except Exception as e:
+            logger.error(f"Error in query processing: {str(e)}")
+            yield f"An error occurred: {str(e)}"
+
+    def _semantic_lookup(self, user_query, search_method, index_name, use_semantic_cache=True):
+        """Embed the query and check the semantic cache; returns (embedding, cached result or None)"""
+        if not index_name:
+            return None, None
+        embedding = self._embed_queries([user_query])[0]
+        if not use_semantic_cache:
+            return embedding, None
+        cached = self.semantic_cache.get(embedding, f"{index_name}|{search_method}")
+        if cached is not None:
+            logger.info("Semantic cache hit")
+        return embedding, cached
+
+    def query_batch(self, user_queries, search_method='hybrid', index_names=None, max_workers=8,
+                    use_semantic_cache=True):
+        """Process several queries: retrieve concurrently, then generate all answers in one batch.
+        Evaluation passes use_semantic_cache=False so every question is answered on its own."""
+        results = [None] * len(user_queries)
+        scopes = [f"{index_name}|{search_method}" for index_name in index_names]
+        embeddings = self._embed_queries(list(user_queries))
+        for i, index_name in enumerate(index_names):
+            if index_name and use_semantic_cache:
+                results[i] = self.semantic_cache.get(embeddings[i], scopes[i])
+        misses = [i for i, result in enumerate(results) if result is None]
+
+        def retrieve(i):
+            try:
+                return self.retrieve_prompt(user_queries[i], search_method, index_names[i], embeddings[i])
+            except Exception as e:
+                return e
+
+        # Plain worker threads work whether or not the caller already runs an event loop
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            prompts = dict(zip(misses, executor.map(retrieve, misses)))
+
+        batch = []
+        for i, prompt in prompts.items():
+            if isinstance(prompt, Exception):
+                logger.error(f"Error in query processing: {str(prompt)}")
+                results[i] = (f"An error occurred: {str(prompt)}", "")
+            elif prompt is None:
+                results[i] = ("I couldn't find any relevant information to answer your query.", "")
+            else:
+                batch.append(i)
+
+        answers = self.generate_batch([prompts[i] for i in batch])
+        for i, answer in zip(batch, answers):
+            if answer is not None:
+                results[i] = (answer, prompts[i])
+                if use_semantic_cache:
+                    self.semantic_cache.put(embeddings[i], scopes[i], results[i])
+            else:
+                logger.error("Failed to generate response")
+                results[i] = ("An error occurred while generating the answer.", "")
+        return results
+
     def rewrite_cot(self, query):
         """Rewrite query using Chain of Thought reasoning"""
         try:
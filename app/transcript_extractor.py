@@ -1,23 +1,39 @@
 import os
 from dotenv import load_dotenv
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-import google_auth_oauthlib.flow
-import googleapiclient.discovery
-import googleapiclient.errors
 import re
 import logging
-import ssl
+import threading
+import time
 import certifi
+import httplib2
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import html
+import io
 import xml.etree.ElementTree as ET
-from datetime import datetime
-import isodate
-import json
+import orjson
+
+__all__ = [
+    'TRANSCRIPT_FETCH_WORKERS',
+    'CHANNEL_MAX_VIDEOS',
+    'get_youtube_client',
+    'extract_video_id',
+    'extract_channel_id',
+    'get_video_metadata',
+    'get_video_metadata_bulk',
+    'get_transcript',
+    'get_transcript_from_timedtext',
+    'read_cached_transcript',
+    'invalidate_cached_transcript',
+    'get_channel_videos',
+    'test_api_key',
+    'initialize_youtube_api',
+]
 
 # Set up logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(), format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Get the directory of the current script
@@ -27,101 +43,236 @@ logger.info(f"The .env path is: {dotenv_path}")
 load_dotenv(dotenv_path)
 
 API_KEY = os.getenv('YOUTUBE_API_KEY')
-logger.info(f"API_KEY: {API_KEY[:5]}...{API_KEY[-5:]}" if API_KEY else "No API key found")
 
 if not API_KEY:
     raise ValueError("YouTube API key not found. Make sure it's set in your .env file.")
 
+# Data API requests retry only transient failures (5xx, 429/rate-limit 403s,
+# connection resets and timeouts) with exponential backoff; 4xx errors such as
+# a missing video fail on the first attempt
+API_NUM_RETRIES = 2
+
+# Timeout in seconds for watch-page, caption and Data API requests
+HTTP_TIMEOUT = 30
+
+# Number of videos whose transcripts are downloaded at once during bulk ingestion
+TRANSCRIPT_FETCH_WORKERS = int(os.getenv('TRANSCRIPT_FETCH_WORKERS', '10'))
+
+# Fetched transcripts are kept on disk as JSON so re-ingesting a video skips
+# the network; an empty TRANSCRIPT_CACHE_DIR disables the cache
+TRANSCRIPT_CACHE_DIR = os.getenv('TRANSCRIPT_CACHE_DIR', 'data/transcript_cache')
+TRANSCRIPT_CACHE_TTL = int(os.getenv('TRANSCRIPT_CACHE_TTL', str(7 * 24 * 3600)))
+
+# One pooled session for all watch-page and caption downloads, so TCP/TLS
+# connections to youtube.com are reused across videos and worker threads
+_SESSION = requests.Session()
+_SESSION.verify = certifi.where()
+_SESSION.headers['Accept-Encoding'] = 'gzip, deflate'
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=max(20, TRANSCRIPT_FETCH_WORKERS),
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504))
+))
+
+WATCH_PAGE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# The discovery client is built once per process and shared by every thread and rerun.
+# Only the httplib2.Http transport is per-thread (get_http), since it is not thread-safe
+_youtube_client = None
+_youtube_client_lock = threading.Lock()
+_thread_local = threading.local()
+
 def get_youtube_client():
+    """Return the shared YouTube API client, building it on first use"""
+    global _youtube_client
+    if _youtube_client is None:
+        with _youtube_client_lock:
+            if _youtube_client is None:
+                _youtube_client = _build_youtube_client()
+    return _youtube_client
+
+def get_http():
+    """Return this thread's HTTP connection for executing YouTube API requests"""
+    http = getattr(_thread_local, 'http', None)
+    if http is None:
+        http = _build_http()
+        _thread_local.http = http
+    return http
+
+def _build_http():
+    """Create a keep-alive HTTP connection to googleapis.com"""
+    from googleapiclient.http import set_user_agent
+    http = httplib2.Http(timeout=HTTP_TIMEOUT, ca_certs=certifi.where())
+    # Google only gzips API responses when the user agent also contains "gzip"
+    return set_user_agent(http, 'rag-youtube-assistant (gzip)')
+
+def _build_youtube_client():
     """Initialize the YouTube API client"""
+    # Discovery is only imported once a client is actually needed
+    from googleapiclient.discovery import build
     try:
-        session = requests.Session()
-        session.verify = certifi.where()
-        http = googleapiclient.http.build_http()
-        http.verify = session.verify
-        youtube = build('youtube', 'v3', developerKey=API_KEY, http=http)
+        # The discovery document ships with google-api-python-client, so building a
+        # client reads it from disk instead of fetching it over the network
+        youtube = build('youtube', 'v3', developerKey=API_KEY, http=_build_http(),
+                        cache_discovery=False, static_discovery=True)
         logger.info("YouTube API client initialized successfully")
         return youtube
     except Exception as e:
         logger.error(f"Error initializing YouTube API client: {str(e)}")
         raise
 
+# URL patterns compiled once at import
+_VIDEO_ID_PATTERNS = (
+    re.compile(r'(?:v=|/)([0-9A-Za-z_-]{11})'),  # Standard and shortened URLs
+    re.compile(r'embed/([0-9A-Za-z_-]{11})'),    # Embed URLs
+    re.compile(r'youtu\.be/([0-9A-Za-z_-]{11})')  # Shortened URLs
+)
+_CHANNEL_ID_PATTERN = re.compile(r'youtube\.com/channel/([^/]+)')  # Channel ID
+_CHANNEL_URL_PATTERNS = (
+    _CHANNEL_ID_PATTERN,
+    re.compile(r'youtube\.com/c/([^/]+)'),     # Custom URL
+    re.compile(r'youtube\.com/user/([^/]+)'),  # Username
+    re.compile(r'youtube\.com/([^/]+)')        # Direct username
+)
+
 def extract_video_id(url):
     """Extract video ID from various YouTube URL formats"""
     if not url:
         return None
-    # Handle various URL formats
-    patterns = [
-        r'(?:v=|\/)([0-9A-Za-z_-]{11}).*',  # Standard and shortened URLs
-        r'(?:embed\/)([0-9A-Za-z_-]{11})',   # Embed URLs
-        r'(?:youtu\.be\/)([0-9A-Za-z_-]{11})'  # Shortened URLs
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, url)
+    for pattern in _VIDEO_ID_PATTERNS:
+        match = pattern.search(url)
         if match:
             return match.group(1)
     return None
 
+# videos.list accepts at most 50 ids per request
+VIDEOS_LIST_MAX_IDS = 50
+
+def parse_video_item(video):
+    """Convert a videos.list item into our metadata dict"""
+    snippet = video['snippet']
+    
+    description = snippet.get('description', '').strip()
+    if not description:
+        description = 'Not Available'
+    
+    return {
+        'title': snippet['title'],
+        'author': snippet['channelTitle'],
+        'upload_date': snippet['publishedAt'],
+        'view_count': video['statistics'].get('viewCount', '0'),
+        'like_count': video['statistics'].get('likeCount', '0'),
+        'comment_count': video['statistics'].get('commentCount', '0'),
+        'duration': video['contentDetails']['duration'],
+        'description': description
+    }
+
+def get_video_metadata_bulk(video_ids):
+    """Get metadata for many videos with one API request per 50 ids; returns {video_id: metadata}"""
+    youtube = get_youtube_client()
+    # Duplicate ids would waste slots in the 50-id requests
+    video_ids = list(dict.fromkeys(video_ids))
+    metadata = {}
+    for start in range(0, len(video_ids), VIDEOS_LIST_MAX_IDS):
+        chunk = video_ids[start:start + VIDEOS_LIST_MAX_IDS]
+        try:
+            response = youtube.videos().list(
+                part="snippet,contentDetails,statistics",
+                id=",".join(chunk)
+            ).execute(http=get_http(), num_retries=API_NUM_RETRIES)
+            for video in response.get('items', []):
+                metadata[video['id']] = parse_video_item(video)
+        except Exception as e:
+            logger.error(f"Error fetching metadata for videos {chunk[0]}..{chunk[-1]}: {str(e)}")
+    missing = len(video_ids) - len(metadata)
+    if missing:
+        logger.warning(f"No metadata found for {missing} of {len(video_ids)} videos")
+    return metadata
+
 def get_video_metadata(video_id):
     """Get video metadata using YouTube Data API"""
-    youtube = get_youtube_client()
-    try:
-        request = youtube.videos().list(
-            part="snippet,contentDetails,statistics",
-            id=video_id
-        )
-        response = request.execute()
-        if 'items' in response and len(response['items']) > 0:
-            video = response['items'][0]
-            snippet = video['snippet']
-            
-            description = snippet.get('description', '').strip()
-            if not description:
-                description = 'Not Available'
-            
-            return {
-                'title': snippet['title'],
-                'author': snippet['channelTitle'],
-                'upload_date': snippet['publishedAt'],
-                'view_count': video['statistics'].get('viewCount', '0'),
-                'like_count': video['statistics'].get('likeCount', '0'),
-                'comment_count': video['statistics'].get('commentCount', '0'),
-                'duration': video['contentDetails']['duration'],
-                'description': description
-            }
-        else:
-            logger.error(f"No video found with id: {video_id}")
-            return None
-    except Exception as e:
-        logger.error(f"Error fetching metadata for video {video_id}: {str(e)}")
+    metadata = get_video_metadata_bulk([video_id]).get(video_id)
+    if metadata is None:
+        logger.error(f"No video found with id: {video_id}")
+    return metadata
+
+# Characters that matter when walking a JSON array to its closing bracket. The pattern
+# and the marker are matched against undecoded UTF-8 bytes, which is safe because
+# ASCII bytes never occur inside a multi-byte character
+_JSON_DELIMITERS_RE = re.compile(rb'[\[\]"\\]')
+_CAPTION_TRACKS_MARKER = b'"captionTracks":['
+
+# The watch page is read in chunks of this many bytes until the caption list is complete
+WATCH_PAGE_CHUNK_SIZE = 65536
+
+def extract_json_array(data, marker, pos=0):
+    """Return the JSON array bytes that start at the '[' ending marker, or None.
+
+    Walks only bracket, quote and backslash characters while tracking nesting
+    depth and string state, so the scan is linear and cannot backtrack.
+    """
+    start = data.find(marker, pos)
+    if start < 0:
         return None
+    start += len(marker) - 1
+    depth = 0
+    in_string = False
+    escaped_at = -1
+    for match in _JSON_DELIMITERS_RE.finditer(data, start):
+        i = match.start()
+        if i == escaped_at:
+            continue
+        char = match.group()
+        if in_string:
+            if char == b'\\':
+                escaped_at = i + 1
+            elif char == b'"':
+                in_string = False
+        elif char == b'"':
+            in_string = True
+        elif char == b'[':
+            depth += 1
+        elif char == b']':
+            depth -= 1
+            if depth == 0:
+                return bytes(data[start:i + 1])
+    return None
+
+def fetch_caption_tracks(video_id):
+    """Stream the watch page only until its caption track list is complete; returns the list's JSON bytes or None"""
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    # The page is never decoded; only the caption JSON slice is parsed (orjson reads UTF-8 bytes)
+    html_content = bytearray()
+    search_from = 0
+    with _SESSION.get(url, headers=WATCH_PAGE_HEADERS, timeout=HTTP_TIMEOUT, stream=True) as response:
+        for chunk in response.iter_content(chunk_size=WATCH_PAGE_CHUNK_SIZE):
+            html_content += chunk
+            marker_at = html_content.find(_CAPTION_TRACKS_MARKER, search_from)
+            if marker_at < 0:
+                # The marker may straddle chunks, so rescan only the tail next time
+                search_from = max(0, len(html_content) - len(_CAPTION_TRACKS_MARKER))
+                continue
+            caption_data = extract_json_array(html_content, _CAPTION_TRACKS_MARKER, marker_at)
+            if caption_data is not None:
+                # Closing here skips the rest of the page
+                return caption_data
+            search_from = marker_at
+    return None
 
 def get_transcript_from_timedtext(video_id):
     """Get transcript using YouTube's timedtext API"""
     try:
         # First get the video page to find available captions
-        session = requests.Session()
-        session.verify = certifi.where()
-        
-        # Get video webpage
-        url = f"https://www.youtube.com/watch?v={video_id}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = session.get(url, headers=headers)
-        html_content = response.text
-
-        # Extract caption data
-        captions_regex = r'"captions":{.*?"playerCaptionsTracklistRenderer":.*?"captionTracks":\[(.*?)\]'
-        captions_match = re.search(captions_regex, html_content, re.DOTALL)
+        caption_data = fetch_caption_tracks(video_id)
         
-        if not captions_match:
+        if not caption_data:
             logger.warning(f"No captions found for video {video_id}")
             return None
 
         # Parse caption data
-        caption_data = captions_match.group(1)
-        caption_list = json.loads(f"[{caption_data}]")
+        caption_list = orjson.loads(caption_data)
         
         # Find English captions or fall back to first available
         caption_url = None
@@ -138,28 +289,32 @@ def get_transcript_from_timedtext(video_id):
             return None
 
         # Get the transcript XML
-        response = session.get(caption_url)
+        response = _SESSION.get(caption_url, timeout=HTTP_TIMEOUT)
         if response.status_code != 200:
             logger.error(f"Failed to fetch transcript: {response.status_code}")
             return None
 
-        # Parse the XML
-        root = ET.fromstring(response.text)
+        # Stream-parse the raw bytes (expat handles the encoding) and free each
+        # element once read, so the full tree is never held in memory
         transcript = []
+        unescape = html.unescape
         
-        for text in root.findall('.//text'):
-            start = float(text.get('start', 0))
-            duration = float(text.get('dur', 0))
+        for _, text in ET.iterparse(io.BytesIO(response.content), events=('end',)):
+            if text.tag != 'text':
+                continue
+            # Clean up text; captions are often double-escaped (&amp;#39;), but
+            # most segments contain no entity at all and can skip html.unescape
             content = text.text or ''
-            
-            # Clean up text
-            content = html.unescape(content).strip()
+            if '&' in content:
+                content = unescape(content)
+            content = content.strip()
             if content:
                 transcript.append({
                     'text': content,
-                    'start': start,
-                    'duration': duration
+                    'start': float(text.get('start', '0')),
+                    'duration': float(text.get('dur', '0'))
                 })
+            text.clear()
 
         return transcript
 
@@ -167,13 +322,60 @@ def get_transcript_from_timedtext(video_id):
         logger.error(f"Error getting transcript for video {video_id}: {str(e)}")
         return None
 
-def get_transcript(video_id):
-    """Main function to get both video metadata and transcript"""
+def _transcript_cache_path(video_id):
+    return os.path.join(TRANSCRIPT_CACHE_DIR, f"{video_id}.json")
+
+def read_cached_transcript(video_id):
+    """Return the cached transcript data for a video, or None if missing or expired"""
+    if not TRANSCRIPT_CACHE_DIR:
+        return None
+    path = _transcript_cache_path(video_id)
+    try:
+        if time.time() - os.path.getmtime(path) > TRANSCRIPT_CACHE_TTL:
+            return None
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable transcript cache for video {video_id}: {str(e)}")
+        return None
+
+def write_cached_transcript(video_id, transcript_data):
+    """Store transcript data for a video; written to a temp file first so readers never see a partial file"""
+    if not TRANSCRIPT_CACHE_DIR:
+        return
+    path = _transcript_cache_path(video_id)
+    try:
+        os.makedirs(TRANSCRIPT_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(transcript_data))
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning(f"Could not cache transcript for video {video_id}: {str(e)}")
+
+def invalidate_cached_transcript(video_id):
+    """Drop a video's cached transcript so the next fetch goes to YouTube"""
+    if TRANSCRIPT_CACHE_DIR:
+        try:
+            os.remove(_transcript_cache_path(video_id))
+        except FileNotFoundError:
+            pass
+
+def get_transcript(video_id, metadata=None):
+    """Main function to get both video metadata and transcript; pass prefetched metadata to skip its request"""
     if not video_id:
         return None
     try:
+        cached = read_cached_transcript(video_id)
+        if cached is not None:
+            logger.info(f"Using cached transcript for video {video_id}")
+            return cached
+
         # Get video metadata
-        metadata = get_video_metadata(video_id)
+        if metadata is None:
+            metadata = get_video_metadata(video_id)
         if not metadata:
             return None
 
@@ -187,10 +389,12 @@ def get_transcript(video_id):
         logger.info(f"Metadata for video {video_id}: {metadata}")
         logger.info(f"Transcript length for video {video_id}: {len(transcript)}")
 
-        return {
+        transcript_data = {
             'transcript': transcript,
             'metadata': metadata
         }
+        write_cached_transcript(video_id, transcript_data)
+        return transcript_data
     except Exception as e:
         logger.error(f"Error getting transcript for video {video_id}: {str(e)}")
         return None
@@ -205,7 +409,7 @@ def get_channel_id_from_handle(handle):
             type="channel",
             maxResults=1
         )
-        response = request.execute()
+        response = request.execute(http=get_http(), num_retries=API_NUM_RETRIES)
         
         if response.get('items'):
             return response['items'][0]['snippet']['channelId']
@@ -227,7 +431,7 @@ def get_channel_id_from_username(username):
             type="channel",
             maxResults=1
         )
-        response = request.execute()
+        response = request.execute(http=get_http(), num_retries=API_NUM_RETRIES)
         
         if response.get('items'):
             return response['items'][0]['snippet']['channelId']
@@ -251,18 +455,11 @@ def extract_channel_id(url):
             return get_channel_id_from_handle(handle)
             
         # Handle different URL patterns
-        patterns = [
-            r'youtube\.com/channel/([^/]+)',    # Channel ID
-            r'youtube\.com/c/([^/]+)',          # Custom URL
-            r'youtube\.com/user/([^/]+)',       # Username
-            r'youtube\.com/([^/]+)'             # Direct username
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, url)
+        for pattern in _CHANNEL_URL_PATTERNS:
+            match = pattern.search(url)
             if match:
                 identifier = match.group(1)
-                if pattern == r'youtube\.com/channel/([^/]+)':
+                if pattern is _CHANNEL_ID_PATTERN:
                     return identifier  # Direct channel ID
                 else:
                     return get_channel_id_from_username(identifier)
@@ -274,8 +471,22 @@ def extract_channel_id(url):
         logger.error(f"Error extracting channel ID: {str(e)}")
         return None
 
-def get_channel_videos(channel_url):
-    """Get list of videos from a YouTube channel"""
+def _uploads_playlist_id(youtube, channel_id):
+    """Return the id of the playlist holding all of a channel's uploads, or None"""
+    response = youtube.channels().list(
+        part="contentDetails",
+        id=channel_id
+    ).execute(http=get_http(), num_retries=API_NUM_RETRIES)
+    items = response.get('items', [])
+    if not items:
+        return None
+    return items[0]['contentDetails']['relatedPlaylists']['uploads']
+
+# Default cap on how many of a channel's newest uploads are listed
+CHANNEL_MAX_VIDEOS = int(os.getenv('CHANNEL_MAX_VIDEOS', '50'))
+
+def get_channel_videos(channel_url, max_videos=CHANNEL_MAX_VIDEOS):
+    """Get up to max_videos of a YouTube channel's videos, newest first"""
     try:
         youtube = get_youtube_client()
         channel_id = extract_channel_id(channel_url)
@@ -287,25 +498,42 @@ def get_channel_videos(channel_url):
         logger.info(f"Found channel ID: {channel_id}")
         
         try:
-            request = youtube.search().list(
-                part="id,snippet",
-                channelId=channel_id,
-                type="video",
-                order="date",
-                maxResults=50
-            )
-            response = request.execute()
+            # Paging the uploads playlist costs 1 quota unit per 50 videos
+            # (search.list costs 100) and is not capped at the first page
+            uploads_id = _uploads_playlist_id(youtube, channel_id)
+            if not uploads_id:
+                logger.error(f"No uploads playlist found for channel: {channel_id}")
+                return []
 
             videos = []
-            for item in response.get('items', []):
-                video_data = {
-                    'video_id': item['id']['videoId'],
-                    'title': item['snippet']['title'],
-                    'description': item['snippet']['description'],
-                    'published_at': item['snippet']['publishedAt']
-                }
-                logger.info(f"Found video: {video_data['title']}")
-                videos.append(video_data)
+            page_token = None
+            while len(videos) < max_videos:
+                response = youtube.playlistItems().list(
+                    part="snippet,contentDetails",
+                    playlistId=uploads_id,
+                    maxResults=min(50, max_videos - len(videos)),
+                    pageToken=page_token
+                ).execute(http=get_http(), num_retries=API_NUM_RETRIES)
+
+                for item in response.get('items', []):
+                    content_details = item['contentDetails']
+                    # Private and deleted uploads have no publish date
+                    if 'videoPublishedAt' not in content_details:
+                        continue
+                    video_data = {
+                        'video_id': content_details['videoId'],
+                        'title': item['snippet']['title'],
+                        'description': item['snippet']['description'],
+                        'published_at': content_details['videoPublishedAt']
+                    }
+                    logger.info(f"Found video: {video_data['title']}")
+                    videos.append(video_data)
+                    if len(videos) >= max_videos:
+                        break
+
+                page_token = response.get('nextPageToken')
+                if not page_token:
+                    break
             
             return videos
             
@@ -322,7 +550,7 @@ def test_api_key():
     youtube = get_youtube_client()
     try:
         request = youtube.videos().list(part="snippet", id="dQw4w9WgXcQ")
-        response = request.execute()
+        response = request.execute(http=get_http(), num_retries=API_NUM_RETRIES)
         if 'items' in response:
             logger.info("API key is valid and working")
             return True
@@ -1,20 +1,84 @@
 import streamlit as st
-from transcript_extractor import get_transcript
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import io
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from transcript_extractor import (get_transcript, get_video_metadata_bulk, read_cached_transcript,
+                                  invalidate_cached_transcript, TRANSCRIPT_FETCH_WORKERS)
 import logging
 
 logger = logging.getLogger(__name__)
 
-def process_single_video(db_handler, data_processor, video_id, embedding_model):
+VIDEO_COLUMNS = ['youtube_id', 'title', 'channel_name', 'upload_date']
+VIDEOS_PAGE_SIZE = 50
+
+# Leading underscores stop Streamlit hashing the database handler
+@st.cache_data(ttl=30, show_spinner=False)
+def load_video_channels(_db_handler):
+    """Load the distinct channel names, cached across reruns"""
+    return _db_handler.get_video_channels()
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_video_count(_db_handler, channel_name=None):
+    """Count processed videos, cached across reruns"""
+    return _db_handler.count_videos(channel_name)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_videos_page(_db_handler, page, page_size=VIDEOS_PAGE_SIZE, channel_name=None):
+    """Load one page of processed videos as a DataFrame, cached across reruns"""
+    logger.info(f"Loading videos page {page} from database (cache miss)")
+    videos = _db_handler.get_videos_page((page - 1) * page_size, page_size, channel_name)
+    return pd.DataFrame(videos, columns=VIDEO_COLUMNS)
+
+def clear_video_caches():
+    """Drop cached video listings after videos were added"""
+    load_video_channels.clear()
+    load_video_count.clear()
+    load_videos_page.clear()
+
+def select_videos_page(db_handler, channel_name=None, key=None):
+    """Render a page selector and return the selected page of videos"""
+    total_pages = max(1, math.ceil(load_video_count(db_handler, channel_name) / VIDEOS_PAGE_SIZE))
+    page = st.number_input(f"Page (of {total_pages})", min_value=1, max_value=total_pages, value=1, key=key)
+    return load_videos_page(db_handler, int(page), channel_name=channel_name)
+
+def read_csv_fast(csv_path):
+    """Read a CSV with PyArrow, preferring an up-to-date Parquet copy next to it"""
+    parquet_path = os.path.splitext(csv_path)[0] + '.parquet'
+    if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path):
+        return pq.read_table(parquet_path).to_pandas(self_destruct=True, split_blocks=True)
+
+    table = pa_csv.read_csv(csv_path)
+    try:
+        pq.write_table(table, parquet_path)
+    except Exception as e:
+        logger.warning(f"Could not write Parquet copy of {csv_path}: {str(e)}")
+    return table.to_pandas(self_destruct=True, split_blocks=True)
+
+def to_csv_bytes(df):
+    """Serialize a DataFrame to CSV bytes with PyArrow's writer for download buttons"""
+    buf = io.BytesIO()
+    pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buf)
+    return buf.getvalue()
+
+def process_single_video(db_handler, data_processor, video_id, embedding_model, check_existing=True, metadata=None,
+                         transcript_data=None):
     """Process a single video for indexing"""
     try:
-        # Check for existing index
-        existing_index = db_handler.get_elasticsearch_index_by_youtube_id(video_id)
-        if existing_index:
-            logger.info(f"Video {video_id} already processed. Using existing index.")
-            return existing_index
+        # Check for existing index (callers that prefetched indices in bulk skip this)
+        if check_existing:
+            existing_index = db_handler.get_elasticsearch_index_by_youtube_id(video_id)
+            if existing_index:
+                logger.info(f"Video {video_id} already processed. Using existing index.")
+                return existing_index
         
-        # Get transcript data
-        transcript_data = get_transcript(video_id)
+        # Get transcript data (callers that prefetched it pass it in)
+        if transcript_data is None:
+            transcript_data = get_transcript(video_id, metadata=metadata)
         if not transcript_data:
             logger.error(f"Failed to retrieve transcript for video {video_id}")
             return None
@@ -23,6 +87,8 @@ def process_single_video(db_handler, data_processor, video_id, embedding_model):
         processed_data = data_processor.process_transcript(video_id, transcript_data)
         if not processed_data:
             logger.error(f"Failed to process transcript for video {video_id}")
+            # Don't keep serving an unusable transcript from the disk cache until it expires
+            invalidate_cached_transcript(video_id)
             return None
 
         # Prepare video data
@@ -59,4 +125,54 @@ def process_single_video(db_handler, data_processor, video_id, embedding_model):
 
     except Exception as e:
         logger.error(f"Error processing video {video_id}: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+def process_multiple_videos(db_handler, data_processor, video_ids, embedding_model):
+    """Process several videos for indexing with a progress bar"""
+    progress_bar = st.progress(0)
+    total = len(video_ids)
+    
+    # Look up already-indexed videos in one query instead of one per video
+    existing_indices = db_handler.get_elasticsearch_indices_by_youtube_ids(video_ids)
+    pending = [video_id for video_id in video_ids if video_id not in existing_indices]
+    processed = total - len(pending)
+    if processed:
+        st.info(f"{processed} videos already processed. Using existing indices.")
+        progress_bar.progress(processed / total)
+    
+    # Transcripts already in the disk cache carry their metadata, so only the
+    # misses cost YouTube API quota
+    cached = {}
+    for video_id in pending:
+        transcript_data = read_cached_transcript(video_id)
+        if transcript_data is not None:
+            cached[video_id] = transcript_data
+    misses = [video_id for video_id in pending if video_id not in cached]
+    
+    # Fetch metadata for the videos to download in batches of 50 ids
+    metadata = get_video_metadata_bulk(misses) if misses else {}
+    
+    def index_video(video_id, transcript_data):
+        nonlocal processed
+        if not transcript_data:
+            logger.error(f"Failed to retrieve transcript for video {video_id}")
+        elif process_single_video(db_handler, data_processor, video_id, embedding_model,
+                                  check_existing=False, transcript_data=transcript_data):
+            processed += 1
+        progress_bar.progress(processed / total)
+    
+    # Download transcripts concurrently; indexing stays sequential because the
+    # data processor and database handler are shared, and each video is indexed
+    # as soon as its download finishes rather than waiting on slower ones ahead of it
+    with ThreadPoolExecutor(max_workers=TRANSCRIPT_FETCH_WORKERS) as executor:
+        futures = {
+            executor.submit(get_transcript, video_id, metadata=metadata.get(video_id)): video_id
+            for video_id in misses
+        }
+        # Cached videos are indexed while the downloads are in flight
+        for video_id, transcript_data in cached.items():
+            index_video(video_id, transcript_data)
+        for future in as_completed(futures):
+            index_video(futures[future], future.result())
+    
+    st.success(f"Processed {processed} out of {total} videos")
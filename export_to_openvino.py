@@ -0,0 +1,36 @@
+# export_to_openvino.py
+
+import openvino as ov
+from openvino_tokenizers import convert_tokenizer
+from optimum.intel import OVModelForCausalLM, OVWeightQuantizationConfig
+from transformers import AutoTokenizer
+
+model_id = "./Phi-3-mini-128k-instruct"
+
+# Output path for the OpenVINO model
+openvino_model_path = "./Phi-3-mini-128k-instruct_openvino"
+
+# Compress weights to symmetric INT4 so each decoded token reads a quarter of the FP16 weight bytes.
+# Passing the config to the export replaces the default INT8 compression applied to models
+# over 1B parameters, so INT4 is computed from the original weights.
+quantization_config = OVWeightQuantizationConfig(bits=4, sym=True, group_size=128, ratio=1.0)
+
+# Convert the PyTorch model straight to OpenVINO IR, without an ONNX intermediate.
+# The traced graph keeps dynamic sequence length and the past-key-value inputs/outputs.
+model = OVModelForCausalLM.from_pretrained(
+    model_id,
+    export=True,
+    compile=False,
+    trust_remote_code=True,
+    quantization_config=quantization_config
+)
+model.save_pretrained(openvino_model_path)
+
+# LLMPipeline loads the OpenVINO tokenizer/detokenizer from the model directory
+tokenizer = AutoTokenizer.from_pretrained(model_id)
+tokenizer.save_pretrained(openvino_model_path)
+ov_tokenizer, ov_detokenizer = convert_tokenizer(tokenizer, with_detokenizer=True)
+ov.save_model(ov_tokenizer, f"{openvino_model_path}/openvino_tokenizer.xml")
+ov.save_model(ov_detokenizer, f"{openvino_model_path}/openvino_detokenizer.xml")
+
+print("Model exported to OpenVINO format.")
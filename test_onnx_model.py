@@ -1,36 +1,20 @@
-import numpy as np
-import onnxruntime as ort
+from optimum.onnxruntime import ORTModelForCausalLM
 from transformers import AutoTokenizer
 
-# Load the tokenizer
-tokenizer = AutoTokenizer.from_pretrained("./Phi-3-mini-128k-instruct")
+# Path to the exported ONNX model (with past-key-values)
+model_path = "./Phi-3-mini-128k-instruct_onnx"
 
-# Load the ONNX model
-model_path = "./Phi-3-mini-128k-instruct_onnx/Phi-3-mini-128k-instruct.onnx"
-
-# Load the ONNX Runtime session
-ort_session = ort.InferenceSession(model_path)
-
-# Check input names
-input_names = [input.name for input in ort_session.get_inputs()]
-print("Input names:", input_names)
+# Load the tokenizer and the ONNX Runtime model
+tokenizer = AutoTokenizer.from_pretrained(model_path)
+model = ORTModelForCausalLM.from_pretrained(model_path, use_cache=True)
 
 # Prepare the input message
 message = "What is OpenVINO?"
+inputs = tokenizer(message, return_tensors="pt")
 
-# Tokenize the input and convert to numpy array with int64 type
-inputs = tokenizer(message, return_tensors="np")
-onnx_inputs = {input_names[0]: inputs["input_ids"].astype(np.int64)}  # Ensure int64
-
-# Run inference
-outputs = ort_session.run(None, onnx_inputs)
-
-# Extract the generated text from the output
-logits = outputs[0]
-
-# Convert logits to token IDs and decode to text
-predicted_token_ids = np.argmax(logits, axis=-1)  # Get the index of the highest logit
-predicted_text = tokenizer.decode(predicted_token_ids[0], skip_special_tokens=True)
+# Generate token by token; the KV cache is fed back between steps
+output_ids = model.generate(**inputs, max_new_tokens=200)
+predicted_text = tokenizer.decode(output_ids[0], skip_special_tokens=True)
 
 # Print the generated text
 print(predicted_text)
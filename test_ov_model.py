@@ -1,7 +1,8 @@
 import openvino_genai as ov_genai
 
-model_path = "./model/Phi-3-mini-128k-instruct-fp32-openvino/fp32"
+model_path = "./Phi-3-mini-128k-instruct_openvino"
 
 device = "CPU"
-pipe = ov_genai.LLMPipeline(model_path, device)
+# u8 KV cache and dynamically quantized activations, matching the app's CPU settings
+pipe = ov_genai.LLMPipeline(model_path, device, KV_CACHE_PRECISION="u8", DYNAMIC_QUANTIZATION_GROUP_SIZE="32")
 print(pipe.generate("What is OpenVINO?", max_length=2000))